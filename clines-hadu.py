@@ -1,3 +1,6 @@
+import io
+import logging
+import os
 import re
 import sys
 import unicodedata
@@ -7,9 +10,11 @@ from random import shuffle
 from PyQt4 import QtCore, QtGui
 from PyQt4.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
 
-from tester import CLineTester
+from tester import CLineTester, setup_logging
 
 
+logger = logging.getLogger(__name__)
+
 try:
     _fromUtf8 = QtCore.QString.fromUtf8
 except AttributeError:
@@ -33,11 +38,12 @@ class CLineTestWorkerSignals(QObject):
     """Defines what signals our thread worker will send.
 
     We just use a
-    - finished: to be set with the cline tuple and an error message (empty string if testing was successful)
+    - finished: to be set with the testing run id, the cline tuple and an error message (empty string if testing
+      was successful)
     - error: in case an Exception is raised
     """
 
-    finished = pyqtSignal(tuple, str)
+    finished = pyqtSignal(int, tuple, str)
     error = pyqtSignal(object)
 
 
@@ -48,8 +54,9 @@ class CLineTestWorker(QRunnable):
     handled CLinesWindow in the main thread.
     """
 
-    def __init__(self, server_name, port, user, pw, *args, **kwargs):
+    def __init__(self, run_id, server_name, port, user, pw, *args, **kwargs):
         super(CLineTestWorker, self).__init__(*args, **kwargs)
+        self.run_id = run_id
         self.server_name = server_name
         self.port = port
         self.user = user
@@ -67,7 +74,7 @@ class CLineTestWorker(QRunnable):
             self.signals.error.emit(e)
             error_msg = e.message
         finally:
-            self.signals.finished.emit((self.server_name, self.port, self.user, self.pw), error_msg or '')
+            self.signals.finished.emit(self.run_id, (self.server_name, self.port, self.user, self.pw), error_msg or '')
 
 
 class CLinesWindow(QtGui.QMainWindow):
@@ -84,6 +91,10 @@ class CLinesWindow(QtGui.QMainWindow):
     INVALID_CLINES_DO_NOTHING = 'no'
     ON_INVALID_CLINES = INVALID_CLINES_EXCLUDE
 
+    # Working clines are appended to this file in hadu format as soon as they are tested, so they can be used
+    # before testing is over. Set to None to disable the file sink.
+    LIVE_HADU_FILE = os.path.join(os.path.expanduser('~'), 'hadu-live.ini')
+
     def __init__(self):
         QtGui.QMainWindow.__init__(self)
 
@@ -94,8 +105,12 @@ class CLinesWindow(QtGui.QMainWindow):
         self._clines_textarea = None
         self._c_widget = None
         self._hadu_textarea = None
+        self._live_file = None
+        self._live_is_empty = True
+        self._run_id = 0
         self._n_tested = 0
         self.servers_to_test = {}
+        self.cline_numbers = {}
 
         # Drawing window stuff
         self.resize(640, 480)
@@ -110,6 +125,25 @@ class CLinesWindow(QtGui.QMainWindow):
         self.layout.addWidget(self.scroll_area)
         self.scroll_area.setWidget(self.stacked_widget)
 
+        # LIVE HADU LINES
+        # Working clines are shown here in hadu format while testing is still running, so the user can copy
+        # them without waiting for the slowest server. Kept out of the scroll area so it's always visible.
+        self.live_widget = QtGui.QWidget(self)
+        live_layout = QtGui.QVBoxLayout(self.live_widget)
+        live_layout.setContentsMargins(0, 0, 0, 0)
+
+        self._live_textarea = QtGui.QPlainTextEdit(self.live_widget)
+        self._live_textarea.setObjectName(_fromUtf8("Live hadu lines"))
+        self._live_textarea.setReadOnly(True)
+        live_layout.addWidget(self._live_textarea)
+
+        copy_button = QtGui.QPushButton('Copy working lines', self.live_widget)
+        copy_button.clicked.connect(self.copy_live_hadu_lines)
+        live_layout.addWidget(copy_button)
+
+        self.layout.addWidget(self.live_widget)
+        self.live_widget.hide()
+
         self.widget = QtGui.QWidget()
         self.widget.setLayout(self.layout)
         self.setCentralWidget(self.widget)
@@ -200,6 +234,7 @@ class CLinesWindow(QtGui.QMainWindow):
         clines_grouped = dict(clines_grouped)
 
         checkboxes = []
+        self.cline_numbers = {}
 
         if clines_grouped:
             i = 1
@@ -217,6 +252,10 @@ class CLinesWindow(QtGui.QMainWindow):
 
                     self.servers_to_test[
                         (server_name, port, user, pw)] = checkbox
+                    # Numbering hadu sections by checkbox position, so a cline gets the same section name whether
+                    # it is output live or in the final hadu page.
+                    self.cline_numbers[
+                        (server_name, port, user, pw)] = len(checkboxes) - 1
 
                 i += 1
 
@@ -245,6 +284,7 @@ class CLinesWindow(QtGui.QMainWindow):
 
         self._checkboxes = []
         self.clines = []
+        self.servers_to_test = {}
 
         self.setWindowTitle(u"CCCAM - Testing servers")
 
@@ -280,6 +320,7 @@ class CLinesWindow(QtGui.QMainWindow):
         self.progress_bar.show()
         self.progress_bar.setTextVisible(True)
         self._update_progress_bar()
+        self.live_widget.show()
 
         self.start_testing()
 
@@ -297,9 +338,13 @@ class CLinesWindow(QtGui.QMainWindow):
         # A thread pool is a thread automatically hadling various tasks.
         self.threadpool = QThreadPool()
         self._n_tested = 0
+        self._stop_testing()
+
+        self._live_textarea.clear()
+        self._live_is_empty = True
 
         for data in self.servers_to_test:
-            worker = CLineTestWorker(*data)
+            worker = CLineTestWorker(self._run_id, *data)
             # When each worker is done, `end_testing` is called.
             worker.signals.finished.connect(self.end_testing)
 
@@ -309,15 +354,62 @@ class CLinesWindow(QtGui.QMainWindow):
     def _update_progress_bar(self, value=0):
         self.progress_bar.setValue(value)
 
-    def end_testing(self, server_data, error_msg=''):
+    def _stop_testing(self):
+        """Invalidates the current testing run: results of its workers, still testing, are ignored by
+        `end_testing`.
+        """
+        self._run_id += 1
+        self._close_live_file()
+
+    def _open_live_file(self):
+        """Opens the live hadu file, overwriting the one of the previous run."""
+        try:
+            self._live_file = io.open(self.LIVE_HADU_FILE, 'w', encoding='utf-8')
+        except (IOError, OSError) as e:
+            logger.warning("Cannot write live hadu lines to %s: %s", self.LIVE_HADU_FILE, e)
+
+    def _close_live_file(self):
+        if self._live_file is not None:
+            self._live_file.close()
+            self._live_file = None
+
+    def append_live_hadu_string(self, server_data):
+        """Appends a working cline, in hadu format, to the live textarea and to the live file.
+        """
+        n = self.cline_numbers[server_data]
+
+        text = self.cline_to_hadu_string(n, server_data)
+        separator = '' if self._live_is_empty else '\n'
+
+        if self._live_is_empty and self.LIVE_HADU_FILE:
+            # The file of the previous run is kept until this run has a working cline to replace it with
+            self._open_live_file()
+        self._live_is_empty = False
+
+        self._live_textarea.moveCursor(QtGui.QTextCursor.End)
+        self._live_textarea.insertPlainText(separator + text)
+
+        if self._live_file is not None:
+            self._live_file.write(unicode(separator + text))
+            self._live_file.flush()
+
+    def copy_live_hadu_lines(self):
+        QtGui.QApplication.clipboard().setText(self._live_textarea.toPlainText())
+
+    def end_testing(self, run_id, server_data, error_msg=''):
         """Callback method that handles each thread worker finishing testing, with success or not.
 
         It updated the progress bar and the checkbox text with a success/failure message .
         """
+        if run_id != self._run_id:
+            # Late result of a previous testing run
+            return
+
         self._n_tested += 1
         self._update_progress_bar(self._n_tested)
 
-        checkbox = self.servers_to_test[tuple(server_data)]
+        server_data = tuple(server_data)
+        checkbox = self.servers_to_test[server_data]
         t = checkbox.text()
 
         if error_msg:
@@ -328,13 +420,15 @@ class CLinesWindow(QtGui.QMainWindow):
             # SUCCESS!
             checkbox.setChecked(True)
             checkbox.setText("%s  [OK]" % t)
+            self.append_live_hadu_string(server_data)
 
         if self._n_tested >= len(self.servers_to_test):
             # All servers have been tested, enabling the ok button.
             self.button_ok.setDisabled(False)
+            self._close_live_file()
 
     def cline_to_hadu_string(self, n, cline, invalid=False):
-        """Converts a cline tuple into a hadu plugin string.
+        """Converts a cline tuple into a hadu plugin string, or None if an invalid cline has to be excluded.
         e.g.
         """
 
@@ -349,10 +443,10 @@ class CLinesWindow(QtGui.QMainWindow):
                ":{port}:0:{user}:{pw}\n"
         server, port, user, pw = cline
 
-        self.hadu_lines.append(text.format(
+        return text.format(
             servname='%s_%s' % (n, slugify(server)), server=server, port=port,
             user=user, pw=pw, comment=comment
-        ))
+        )
 
     def page3(self):
         """Final page, showing valid clines in had format.
@@ -361,8 +455,12 @@ class CLinesWindow(QtGui.QMainWindow):
 
         self.stacked_widget.removeWidget(self._c_widget)
 
-        for i, checkbox in enumerate(self._checkboxes):
-            self.cline_to_hadu_string(i, self.clines[i], invalid=not checkbox.isChecked())
+        self.hadu_lines = []
+        for server_data, n in sorted(self.cline_numbers.items(), key=lambda item: item[1]):
+            checkbox = self.servers_to_test[server_data]
+            hadu_string = self.cline_to_hadu_string(n, server_data, invalid=not checkbox.isChecked())
+            if hadu_string is not None:
+                self.hadu_lines.append(hadu_string)
 
         self._hadu_textarea = QtGui.QPlainTextEdit(self)
         self._hadu_textarea.setGeometry(QtCore.QRect(10, 20, 461, 451))
@@ -381,6 +479,8 @@ class CLinesWindow(QtGui.QMainWindow):
         self.button_cancel.show()
         self.button_cancel.setDisabled(False)
         self.progress_bar.hide()
+        self.live_widget.hide()
+        self._stop_testing()
 
         if self.page_index == 1:
             self.button_cancel.setDisabled(True)
@@ -408,6 +508,7 @@ class CLinesWindow(QtGui.QMainWindow):
 
 
 if __name__ == "__main__":
+        setup_logging()
         app = QtGui.QApplication(sys.argv)
         clines_app = CLinesWindow()
         clines_app.show()
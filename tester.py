@@ -2,18 +2,123 @@
 # -*- coding: utf-8 -*-
 
 import array
+import atexit
 import hashlib
 import logging
 import re
 import socket
+import threading
+from collections import defaultdict
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 from cryptoblock import CryptographicBlock, Xor
 
 
-logging.basicConfig(level=logging.INFO)
+class QueueHandler(logging.Handler):
+    """Logging handler that just puts records in a queue, so formatting and writing to stderr are done by a
+    `QueueListener` thread instead of the thread workers testing clines.
+    """
+
+    def __init__(self, records_queue):
+        logging.Handler.__init__(self)
+        self.queue = records_queue
+
+    def emit(self, record):
+        self.queue.put_nowait(record)
+
+
+class QueueListener(object):
+    """Thread that takes records out of a queue and passes them to `handler`."""
+
+    _STOP = None
+
+    def __init__(self, records_queue, handler):
+        self.queue = records_queue
+        self.handler = handler
+        self._thread = threading.Thread(target=self._monitor)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.queue.put_nowait(self._STOP)
+        self._thread.join()
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is self._STOP:
+                break
+            self.handler.handle(record)
+
+
+class OutcomeSampler(logging.Filter):
+    """Filter logging only the first record, and then one every N, of each outcome listed in `rates`.
+
+    Records tell their outcome with `extra={'outcome': ...}`. Outcomes not listed in `rates` are always logged.
+    """
+
+    def __init__(self, rates):
+        logging.Filter.__init__(self)
+        self.rates = rates
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = self.rates.get(getattr(record, 'outcome', None))
+        if not every:
+            return True
+
+        with self._lock:
+            count = self._counts[record.outcome]
+            self._counts[record.outcome] += 1
+
+        if count % every:
+            return False
+        if count:
+            record.msg = "%s (1 of every %d logged)" % (record.msg, every)
+        return True
+
+
+# Expected failures are common when testing many clines, so only a sample of them is logged.
+SAMPLING_RATES = {
+    'timeout': 50,
+    'connection': 50,
+    'bad_credentials': 20,
+    'wrong_ack': 20,
+    'empty_response': 20,
+}
+
 logger = logging.getLogger(__name__)
 
 
+def setup_logging(level=logging.INFO):
+    """Configures the root logger to log to stderr from a `QueueListener` thread, sampling expected failures.
+
+    Meant to be called once by the application, as `logging.basicConfig` would be.
+    """
+    log_queue = queue.Queue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(OutcomeSampler(SAMPLING_RATES))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
+
+
 class InvalidCLine(Exception):
     pass
 
@@ -57,7 +162,9 @@ class CLineTester(object):
         # Receiving the "Hello" response from the server into `response`
         socket.recv_into(response, 16)
 
-        logger.info("Hello byte response: %s " % response)
+        if logger.isEnabledFor(logging.DEBUG):
+            # `response` is modified in place below, logging a copy of it
+            logger.debug("Hello byte response: %r", bytes(response))
 
         # Do a Xor with "CCcam" string to the hello bytes
         response = Xor(response)
@@ -110,12 +217,18 @@ class CLineTester(object):
         match = regex.search(self.cline)
 
         if match is None:
-            logger.error("Not avalid CLine: %s " % self.cline)
+            logger.error("Not avalid CLine: %s", self.cline)
             raise InvalidCLine("%s is not a valid CLine." % self.cline)
 
         self.host, self.port, self.username, self.password = match.groups()
         self.port = int(self.port)
 
+    def _log_socket_error(self, e):
+        """Logs an expected connection failure, without traceback."""
+        outcome = 'timeout' if isinstance(e, socket.timeout) else 'connection'
+        logger.warning("%s %s: %s", type(e).__name__, e, self.cline,
+                       extra={'outcome': outcome})
+
     def test(self):
         """Tests the Cline string by opening a communication with the CCcam server.
 
@@ -129,7 +242,7 @@ class CLineTester(object):
         - failing decryption: we don't understand what the server is saying
         """
 
-        logger.info("Testing CLine: %s " % self.cline)
+        logger.debug("Testing CLine: %s", self.cline)
 
         error_msg = None
 
@@ -151,7 +264,8 @@ class CLineTester(object):
             n_bytes = self.handshake(test_socket)
 
             if n_bytes == 0:
-                logger.error("Server responded 0 bytes: %s " % self.cline)
+                logger.warning("Server responded 0 bytes: %s", self.cline,
+                               extra={'outcome': 'empty_response'})
                 return "Server empty response."
 
             try:
@@ -175,27 +289,33 @@ class CLineTester(object):
 
                 if n_bytes > 0:
                     self._receive_block.decrypt(response, 20)
-                    if (response.decode("ascii").rstrip('\0') ==
-                            self.REQUEST_TYPE):
-                        logger.info(
-                            "SUCCESS! Working cline: %s" % self.cline)
+                    try:
+                        ack = response.decode("ascii").rstrip('\0')
+                    except UnicodeDecodeError:
+                        # Non-ASCII bytes: not a 'CCcam' ACK
+                        ack = None
+                    if ack == self.REQUEST_TYPE:
+                        logger.info("SUCCESS! Working cline: %s", self.cline)
                     else:
-                        logger.error("Wrong ACK: %s " % self.cline)
+                        logger.warning("Wrong ACK: %s", self.cline,
+                                       extra={'outcome': 'wrong_ack'})
                         error_msg = "Wrong ACK received."
                 else:
-                    logger.error("Bad username/password: %s " % self.cline)
+                    logger.warning("Bad username/password: %s", self.cline,
+                                   extra={'outcome': 'bad_credentials'})
                     error_msg = "Bad username/password."
 
             except socket.error as e:
-                logger.exception("%s %s: %s" %
-                                 (type(e), e.message, self.cline))
+                self._log_socket_error(e)
                 error_msg = "Server connection."
             except Exception as e:
-                logger.exception("%s %s: %s" %
-                                 (type(e), e.message, self.cline))
+                logger.exception("%s %s: %s", type(e), e, self.cline)
                 error_msg = "Server error."
+        except socket.error as e:
+            self._log_socket_error(e)
+            error_msg = "Server error."
         except Exception as e:
-            logger.exception("%s %s: %s" % (type(e), e.message, self.cline))
+            logger.exception("%s %s: %s", type(e), e, self.cline)
             error_msg = "Server error."
         finally:
             test_socket.close()